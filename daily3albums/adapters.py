@@ -1,13 +1,21 @@
 # daily3albums/adapters.py
 from __future__ import annotations
 
+from collections import OrderedDict
 from dataclasses import dataclass, field
+from functools import lru_cache
 from difflib import SequenceMatcher
 from typing import Any
-from urllib.parse import urlencode, quote_plus
+from urllib.parse import quote_plus
 import re
+import threading
 import unicodedata
 
+try:
+    from rapidfuzz.fuzz import ratio as _rf_ratio
+except ImportError:  # pragma: no cover - rapidfuzz 是声明依赖，兜底只为裸环境
+    _rf_ratio = None
+
 from daily3albums.request_broker import RequestBroker, RequestFailed
 
 
@@ -32,6 +40,16 @@ def _ensure_list(x: Any) -> list:
     return []
 
 
+def _maybe_int(x: Any) -> int | None:
+    # Last.fm 的数字字段有时是 "123"，有时是 123
+    # 只接受纯数字字符串："-5"、" 12 "、"1_000" 都视为无效，与内联解析时一致
+    if isinstance(x, str) and x.isdigit():
+        return int(x)
+    if isinstance(x, int):
+        return x
+    return None
+
+
 def _pick_lastfm_image(images: Any, prefer_size: str = "extralarge") -> str | None:
     # Last.fm 常见结构：image: [{"#text": "...", "size":"small"}, ...]
     if not isinstance(images, list):
@@ -44,6 +62,7 @@ def _pick_lastfm_image(images: Any, prefer_size: str = "extralarge") -> str | No
         size = (it.get("size") or "").strip()
         if not url:
             continue
+        # 正序扫描：同尺寸重复时取第一个；兜底取最后一个非空 url
         if size == prefer_size:
             return url
         best = url
@@ -159,6 +178,9 @@ def lastfm_tag_top_albums(
 
     out: list[LastFmTopAlbum] = []
     for a in albums:
+        # Last.fm 偶尔会多返回几条，超出 limit 的部分调用方用不到，不必解析
+        if len(out) >= limit:
+            break
         if not isinstance(a, dict):
             continue
 
@@ -174,21 +196,9 @@ def lastfm_tag_top_albums(
 
         mbid = (a.get("mbid") or "").strip() or None
 
-        pc_raw = a.get("playcount")
-        playcount = None
-        if isinstance(pc_raw, str) and pc_raw.isdigit():
-            playcount = int(pc_raw)
-        elif isinstance(pc_raw, int):
-            playcount = pc_raw
-
-        rank = None
+        playcount = _maybe_int(a.get("playcount"))
         attr = a.get("@attr")
-        if isinstance(attr, dict):
-            r = attr.get("rank")
-            if isinstance(r, str) and r.isdigit():
-                rank = int(r)
-            elif isinstance(r, int):
-                rank = r
+        rank = _maybe_int(attr.get("rank")) if isinstance(attr, dict) else None
 
         image_extralarge = _pick_lastfm_image(a.get("image"))
 
@@ -212,6 +222,37 @@ def lastfm_tag_top_albums(
 # -----------------------------
 
 
+# primary-type 编码 / secondary-type 位标记（供 _score_kernel 使用）
+_PT_ALBUM, _PT_EP, _PT_SINGLE, _PT_OTHER = 0, 1, 2, 3
+_PT_CODES = {"album": _PT_ALBUM, "ep": _PT_EP, "single": _PT_SINGLE}
+_ST_COMPILATION, _ST_LIVE, _ST_REMIX = 1, 2, 4
+_ST_PENALTIES = (
+    ("compilation", _ST_COMPILATION, 0.12),
+    ("live", _ST_LIVE, 0.08),
+    ("remix", _ST_REMIX, 0.06),
+)
+
+
+def _score_kernel(
+    title_sim: float,
+    artist_sim: float,
+    primary_type_code: int,
+    sec_flags: int,
+) -> float:
+    conf = 0.72 * title_sim + 0.28 * artist_sim
+    if primary_type_code == _PT_ALBUM:
+        conf += 0.05
+    elif primary_type_code == _PT_EP or primary_type_code == _PT_SINGLE:
+        conf -= 0.10
+    if sec_flags & _ST_COMPILATION:
+        conf -= 0.12
+    if sec_flags & _ST_LIVE:
+        conf -= 0.08
+    if sec_flags & _ST_REMIX:
+        conf -= 0.06
+    return conf
+
+
 @dataclass
 class MbReleaseGroup:
     id: str
@@ -221,6 +262,45 @@ class MbReleaseGroup:
     first_release_date: str | None
     primary_type: str | None
     secondary_types: list[str]
+    # 以下字段构造时一次性算好，评分循环里只做整数/位运算
+    secondary_types_lower: frozenset[str] = field(init=False, repr=False)
+    primary_type_code: int = field(init=False, repr=False)
+    secondary_flags: int = field(init=False, repr=False)
+    type_note: str = field(init=False, repr=False)
+    title_norm: str = field(init=False, repr=False)
+    artist_norm: str = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # 同一个 rg 常被多条 query 命中；归一化在构造时做一次即可
+        self.title_norm = _mb_norm_text(self.title)
+        self.artist_norm = _mb_norm_text(self.artist_credit)
+        self.secondary_types_lower = frozenset(
+            x.lower() for x in (self.secondary_types or []) if isinstance(x, str)
+        )
+        pt = (self.primary_type or "").lower()
+        self.primary_type_code = _PT_CODES.get(pt, _PT_OTHER)
+        flags = 0
+        notes: list[str] = []
+        if self.primary_type_code == _PT_ALBUM:
+            notes.append("pt:album:+0.05")
+        elif self.primary_type_code != _PT_OTHER:
+            notes.append(f"pt:{pt}:-0.10")
+        for name, bit, penalty in _ST_PENALTIES:
+            if name in self.secondary_types_lower:
+                flags |= bit
+                notes.append(f"st:{name}:-{penalty:.2f}")
+        self.secondary_flags = flags
+        self.type_note = ",".join(notes)
+
+
+def _mb_search_url(query: str, limit: int) -> str:
+    # 只有 query 需要编码；结果与 urlencode({"query","fmt","limit"}, quote_via=quote_plus)
+    # 逐字节一致——URL 是 HTTP 缓存与 fixture 的 key，格式不能变
+    return (
+        "https://musicbrainz.org/ws/2/release-group?query="
+        + quote_plus(query)
+        + f"&fmt=json&limit={limit}"
+    )
 
 
 def musicbrainz_search_release_group(
@@ -243,8 +323,7 @@ def musicbrainz_search_release_group_by_query(
     query: str,
     limit: int = 10,
 ) -> list[MbReleaseGroup]:
-    params = {"query": query, "fmt": "json", "limit": str(limit)}
-    url = "https://musicbrainz.org/ws/2/release-group?" + urlencode(params, quote_via=quote_plus)
+    url = _mb_search_url(query, limit)
     headers = {"User-Agent": mb_user_agent, "Accept": "application/json"}
     j = broker.get_json(url, headers=headers, adapter_name="MusicBrainzAdapter")
 
@@ -428,6 +507,58 @@ def _release_group_summary_from_payload(payload: dict[str, Any], *, include_deta
     )
 
 
+_MISS = object()
+
+
+class _BoundedMemo:
+    """线程安全的有界 LRU 表；取值未命中时返回 _MISS，以便与缓存下来的 None 区分。"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return _MISS
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# 进程内缓存：同一天的多个候选常共享 mbid；只缓存确定性结果（异常不缓存，便于重试）。
+# release-group 表存 (summary_or_none, debug_status)，普通与 debug 两条路径共用
+_RG_CACHE = _BoundedMemo(maxsize=2048)
+_REL_CACHE = _BoundedMemo(maxsize=2048)
+
+
+def clear_musicbrainz_caches() -> None:
+    """清空进程内的 MusicBrainz 查询缓存（测试与同进程多次运行之间使用）。"""
+    _RG_CACHE.clear()
+    _REL_CACHE.clear()
+
+
+def _release_group_lookup(j: Any) -> tuple[MbReleaseGroupSummary | None, str]:
+    if not isinstance(j, dict):
+        return None, "rg:bad-json"
+    summary = _release_group_summary_from_payload(j)
+    if summary is None:
+        # 这通常意味着不是 rg endpoint 返回的结构
+        return None, "rg:missing-id"
+    return summary, "rg:ok"
+
+
 def musicbrainz_get_release_group(
     broker: RequestBroker,
     mb_user_agent: str,
@@ -437,20 +568,8 @@ def musicbrainz_get_release_group(
     通过 release-group id 直接获取 release-group。
     成功返回 (id / first-release-date / primary-type)，失败返回 None。
     """
-    rg_id = (rg_id or "").strip()
-    if not rg_id:
-        return None
-
-    url = f"https://musicbrainz.org/ws/2/release-group/{rg_id}?fmt=json"
-    headers = {"User-Agent": mb_user_agent, "Accept": "application/json"}
-    try:
-        j = broker.get_json(url, headers=headers, adapter_name="MusicBrainzAdapter")
-    except Exception:
-        return None
-
-    if not isinstance(j, dict):
-        return None
-    return _release_group_summary_from_payload(j)
+    summary, _status = musicbrainz_get_release_group_debug(broker, mb_user_agent, rg_id)
+    return summary
 
 
 def musicbrainz_get_release_group_details(
@@ -487,6 +606,9 @@ def musicbrainz_get_release_group_debug(
     rg_id = (rg_id or "").strip()
     if not rg_id:
         return None, "rg:skip-empty"
+    cached = _RG_CACHE.get(rg_id)
+    if cached is not _MISS:
+        return cached
 
     url = f"https://musicbrainz.org/ws/2/release-group/{rg_id}?fmt=json"
     headers = {"User-Agent": mb_user_agent, "Accept": "application/json"}
@@ -495,15 +617,9 @@ def musicbrainz_get_release_group_debug(
     except Exception as e:
         return None, f"rg:error:{type(e).__name__}"
 
-    if not isinstance(j, dict):
-        return None, "rg:bad-json"
-
-    summary = _release_group_summary_from_payload(j)
-    if summary is None:
-        # 这通常意味着不是 rg endpoint 返回的结构
-        return None, "rg:missing-id"
-
-    return (summary, "rg:ok")
+    result = _release_group_lookup(j)
+    _RG_CACHE.put(rg_id, result)
+    return result
 
 
 @dataclass
@@ -524,6 +640,9 @@ def musicbrainz_get_release(
     release_id = (release_id or "").strip()
     if not release_id:
         return None
+    cached = _REL_CACHE.get(release_id)
+    if cached is not _MISS:
+        return cached
 
     url = f"https://musicbrainz.org/ws/2/release/{release_id}?fmt=json"
     headers = {"User-Agent": mb_user_agent, "Accept": "application/json"}
@@ -532,15 +651,15 @@ def musicbrainz_get_release(
     except Exception:
         return None
 
-    if not isinstance(j, dict):
-        return None
-    got_id = (j.get("id") or "").strip()
-    if not got_id:
-        return None
-
-    rg = j.get("release-group") or {}
-    rg_id = (rg.get("id") or "").strip() or None
-    return MbReleaseSummary(id=got_id, release_group_id=rg_id)
+    summary: MbReleaseSummary | None = None
+    if isinstance(j, dict):
+        got_id = (j.get("id") or "").strip()
+        if got_id:
+            rg = j.get("release-group") or {}
+            rg_id = (rg.get("id") or "").strip() or None
+            summary = MbReleaseSummary(id=got_id, release_group_id=rg_id)
+    _REL_CACHE.put(release_id, summary)
+    return summary
 
 
 def musicbrainz_get_release_debug(
@@ -649,40 +768,88 @@ def musicbrainz_normalize_mbid_to_release_group_debug(
 # -----------------------------
 
 
+_RE_ZWSP = re.compile(r"[\u200b-\u200f]")
+_RE_APOS = re.compile(r"[’']")
+# 保留：拉丁字母/数字/扩展拉丁、日文、中文；其余都当成空格
+_RE_KEEP = re.compile(r"[^a-z0-9\u00c0-\u024f\u3040-\u30ff\u4e00-\u9fff]+")
+_RE_WS = re.compile(r"\s+")
+_RE_TRAIL_BRACKETS = re.compile(r"\s*[\(\[\{].*?[\)\]\}]\s*$")
+_RE_EDITION = re.compile(
+    r"\b(remaster(ed)?|deluxe|expanded|edition|anniversary|reissue|bonus)\b", re.I
+)
+_RE_FEAT = re.compile(r"\s+(feat\.|featuring|ft\.)\s+", re.I)
+
+
+@lru_cache(maxsize=4096)
 def _mb_norm_text(s: str) -> str:
-    s = unicodedata.normalize("NFKC", (s or "")).lower().strip()
-    s = re.sub(r"[\u200b-\u200f]", "", s)
-    s = re.sub(r"[’']", "", s)
-    # 保留：拉丁字母/数字/扩展拉丁、日文、中文；其余都当成空格
-    s = re.sub(r"[^a-z0-9\u00c0-\u024f\u3040-\u30ff\u4e00-\u9fff]+", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
+    s = s or ""
+    # 纯 ASCII 时 NFKC 是恒等变换，直接跳过
+    if not s.isascii():
+        s = unicodedata.normalize("NFKC", s)
+    s = s.lower().strip()
+    s = _RE_ZWSP.sub("", s)
+    s = _RE_APOS.sub("", s)
+    s = _RE_KEEP.sub(" ", s)
+    s = _RE_WS.sub(" ", s).strip()
     return s
 
 
+@lru_cache(maxsize=4096)
 def _clean_title(title: str) -> str:
     t = unicodedata.normalize("NFKC", (title or "")).strip()
     # 去掉末尾括号/方括号/花括号信息 (Remaster, Deluxe... 常见)
-    t = re.sub(r"\s*[\(\[\{].*?[\)\]\}]\s*$", "", t).strip()
+    t = _RE_TRAIL_BRACKETS.sub("", t).strip()
     # 去掉常见尾缀词（不追求全覆盖，只要稳定）
-    t = re.sub(r"\b(remaster(ed)?|deluxe|expanded|edition|anniversary|reissue|bonus)\b", "", t, flags=re.I)
-    t = re.sub(r"\s+", " ", t).strip()
+    t = _RE_EDITION.sub("", t)
+    t = _RE_WS.sub(" ", t).strip()
     return t
 
 
+@lru_cache(maxsize=4096)
 def _clean_artist(artist: str) -> str:
     a = unicodedata.normalize("NFKC", (artist or "")).strip()
     # 去掉 feat/ft 等后缀
-    a = re.split(r"\s+(feat\.|featuring|ft\.)\s+", a, maxsplit=1, flags=re.I)[0].strip()
-    a = re.sub(r"\s+", " ", a).strip()
+    a = _RE_FEAT.split(a, maxsplit=1)[0].strip()
+    a = _RE_WS.sub(" ", a).strip()
     return a
 
 
-def _ratio(a: str, b: str) -> float:
-    a2 = _mb_norm_text(a)
-    b2 = _mb_norm_text(b)
-    if not a2 or not b2:
+_SM_LOCAL = threading.local()
+
+
+def _ratio_norm(a_norm: str, b_norm: str) -> float:
+    # 入参必须已经过 _mb_norm_text
+    if not a_norm or not b_norm:
         return 0.0
-    return SequenceMatcher(None, a2, b2).ratio()
+    if _rf_ratio is not None:
+        return _rf_ratio(a_norm, b_norm) / 100.0
+    # 兜底：复用线程内的 matcher，参数方向与默认 autojunk 都同 SequenceMatcher(None, a, b)
+    # （ratio 不对称，换方向会改变分数）；b 与上次是同一对象时 set_seq2 会跳过 b2j 重建
+    sm = getattr(_SM_LOCAL, "sm", None)
+    if sm is None:
+        sm = _SM_LOCAL.sm = SequenceMatcher(None)
+    sm.set_seqs(a_norm, b_norm)
+    return sm.ratio()
+
+
+def _ratio(a: str, b: str) -> float:
+    return _ratio_norm(_mb_norm_text(a), _mb_norm_text(b))
+
+
+def _ratio_artist_norm(a_norm: str, b_norm: str) -> float:
+    """
+    艺人名相似度：在整串比较之外再比一次“词排序后”的串，
+    让 "a / b" 与 "b / a" 这类合作署名顺序不同的情况也能对上。
+    不用 token_set：子集即满分（"echo" vs "echo unit"）太宽松，违背“宁缺毋错”。
+    """
+    direct = _ratio_norm(a_norm, b_norm)
+    if direct >= 1.0:
+        return direct
+    a_sorted = " ".join(sorted(a_norm.split()))
+    b_sorted = " ".join(sorted(b_norm.split()))
+    if a_sorted == a_norm and b_sorted == b_norm:
+        return direct
+    return max(direct, _ratio_norm(a_sorted, b_sorted))
 
 
 @dataclass
@@ -697,37 +864,16 @@ class MbBestMatch:
 
 
 def _score_release_group_candidate(
-    clean_title: str,
-    clean_artist: str,
+    norm_title: str,
+    norm_artist: str,
     rg: MbReleaseGroup,
 ) -> tuple[float, float, float, str]:
-    title_sim = _ratio(clean_title, rg.title)
-    rg_artist = rg.artist_credit or ""
-    artist_sim = _ratio(clean_artist, rg_artist) if rg_artist else 0.0
-
-    conf = 0.72 * title_sim + 0.28 * artist_sim
-    note_parts: list[str] = []
+    # 两侧都已归一化：norm_* 由调用方算好，rg.*_norm 在构造时算好
+    title_sim = _ratio_norm(norm_title, rg.title_norm)
+    artist_sim = _ratio_artist_norm(norm_artist, rg.artist_norm)
 
-    pt = (rg.primary_type or "").lower()
-    if pt == "album":
-        conf += 0.05
-        note_parts.append("pt:album:+0.05")
-    elif pt in ("ep", "single"):
-        conf -= 0.10
-        note_parts.append(f"pt:{pt}:-0.10")
-
-    st = {x.lower() for x in (rg.secondary_types or [])}
-    if "compilation" in st:
-        conf -= 0.12
-        note_parts.append("st:compilation:-0.12")
-    if "live" in st:
-        conf -= 0.08
-        note_parts.append("st:live:-0.08")
-    if "remix" in st:
-        conf -= 0.06
-        note_parts.append("st:remix:-0.06")
-
-    return conf, title_sim, artist_sim, ",".join(note_parts)
+    conf = _score_kernel(title_sim, artist_sim, rg.primary_type_code, rg.secondary_flags)
+    return conf, title_sim, artist_sim, rg.type_note
 
 
 def musicbrainz_best_release_group_match(
@@ -773,7 +919,10 @@ def musicbrainz_best_release_group_match_debug(
     clean_title = _clean_title(raw_title)
     clean_artist = _clean_artist(raw_artist)
 
-    if len(_mb_norm_text(clean_title)) < 3:
+    norm_title = _mb_norm_text(clean_title)
+    norm_artist = _mb_norm_text(clean_artist)
+
+    if len(norm_title) < 3:
         return None, None, ["skip:title_too_short"]
 
     attempts: list[tuple[str, str]] = [
@@ -782,6 +931,15 @@ def musicbrainz_best_release_group_match_debug(
         ("search:clean_loose", f"releasegroup:{clean_title} AND artist:{clean_artist}"),
         ("search:title_only", f"releasegroup:{clean_title}"),
     ]
+    # raw == clean 时 strict/clean_strict 是同一条 query，重复请求毫无意义；去重后也不占 query cap
+    seen_queries: set[str] = set()
+    unique_attempts: list[tuple[str, str]] = []
+    for m, q in attempts:
+        if q in seen_queries:
+            continue
+        seen_queries.add(q)
+        unique_attempts.append((m, q))
+    attempts = unique_attempts
     max_queries = max(1, int(max_queries_per_candidate))
     queries_attempted = 0
     query_cap_hit = False
@@ -833,7 +991,9 @@ def musicbrainz_best_release_group_match_debug(
             continue
 
         for rg in rgs[: min(len(rgs), 10)]:
-            conf, title_sim, artist_sim, note = _score_release_group_candidate(clean_title, clean_artist, rg)
+            conf, title_sim, artist_sim, note = _score_release_group_candidate(
+                norm_title, norm_artist, rg
+            )
 
             if title_sim < 0.60:
                 continue
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import copy
+import heapq
 import json
 import os
 import shutil
@@ -8,6 +10,11 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any
 
+try:
+    import orjson
+except ImportError:  # 可选加速依赖：pip install -e ".[speedups]"
+    orjson = None
+
 
 class OutputValidationError(RuntimeError):
     pass
@@ -22,26 +29,88 @@ def _to_jsonable(obj: Any) -> Any:
     return obj
 
 
-def atomic_write_json(path: Path, obj: Any) -> None:
+def _orjson_matches_stdlib(payload: Any) -> bool:
+    """判断 payload 是否落在 orjson 与标准库 json 输出逐字节相同的子集内。
+
+    orjson 会把 NaN/Infinity 写成 null、拒绝超过 64 位的整数、对很大/很小的浮点数用不同的
+    指数写法、还能序列化 json 不支持的类型；这些情况一律交给标准库，保持它的输出与报错。
+    """
+    stack = [payload]
+    while stack:
+        obj = stack.pop()
+        kind = type(obj)
+        if kind is str or obj is None or kind is bool:
+            continue
+        if kind is int:
+            if not -(2**63) <= obj < 2**64:
+                return False
+        elif kind is float:
+            # repr 只在 [1e-4, 1e16) 内用定点写法，与 orjson 一致；0.0 与 -0.0 两边也相同
+            if obj != 0.0 and not 1e-4 <= abs(obj) < 1e16:
+                return False
+        elif kind is dict:
+            for key, value in obj.items():
+                if type(key) is not str:
+                    return False
+                stack.append(value)
+        elif kind is list or kind is tuple:
+            stack.extend(obj)
+        else:
+            return False
+    return True
+
+
+def _dumps_json_bytes(payload: Any) -> bytes:
+    # 输出格式固定：UTF-8、2 空格缩进、key 排序。只有确认两条路径逐字节一致时才走 orjson
+    if orjson is not None and _orjson_matches_stdlib(payload):
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8")
+
+
+# 本进程内已确认存在的目录；目录可能被 prune 删掉，所以写失败时会回退重建
+_MKDIR_CACHE: set[str] = set()
+_O_BINARY = getattr(os, "O_BINARY", 0)
+
+
+def _ensure_parent_dir(path: Path) -> None:
+    key = str(path.parent)
+    if key in _MKDIR_CACHE:
+        return
     path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(path.suffix + ".tmp")
+    _MKDIR_CACHE.add(key)
 
-    payload = _to_jsonable(obj)
-    data = json.dumps(payload, ensure_ascii=False, indent=2, sort_keys=True)
 
-    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
-        f.write(data)
-        f.write("\n")
+def _write_file_bytes(path: Path, data: bytes) -> None:
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY
+    try:
+        fd = os.open(path, flags, 0o644)
+    except FileNotFoundError:
+        _MKDIR_CACHE.discard(str(path.parent))
+        _ensure_parent_dir(path)
+        fd = os.open(path, flags, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: Path, obj: Any) -> None:
+    _ensure_parent_dir(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+
+    data = _dumps_json_bytes(_to_jsonable(obj)) + b"\n"
+    _write_file_bytes(tmp, data)
 
     # Windows 下 os.replace 是原子语义（同盘同目录）
     os.replace(tmp, path)
 
 
 def atomic_write_bytes(path: Path, data: bytes) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
+    _ensure_parent_dir(path)
     tmp = path.with_suffix(path.suffix + ".tmp")
-    with open(tmp, "wb") as f:
-        f.write(data)
+    _write_file_bytes(tmp, data)
     os.replace(tmp, path)
 
 
@@ -56,9 +125,10 @@ def validate_today(issue: dict) -> None:
         raise OutputValidationError("slots must be a list of 3 items")
 
     slot_ids = [slot.get("slot_id") for slot in slots if isinstance(slot, dict)]
-    if len(slot_ids) != 3 or len(set(slot_ids)) != 3:
-        raise OutputValidationError(f"slot_id must be unique: {slot_ids}")
+    # [0,1,2] 本身蕴含唯一性；只有不等时才需要区分是“重复”还是“乱序”
     if slot_ids != [0, 1, 2]:
+        if len(slot_ids) != 3 or len(set(slot_ids)) != 3:
+            raise OutputValidationError(f"slot_id must be unique: {slot_ids}")
         raise OutputValidationError(f"slots must be ordered [0,1,2]: {slot_ids}")
 
     for i, slot in enumerate(slots):
@@ -78,9 +148,16 @@ def validate_today(issue: dict) -> None:
 
     picks = issue.get("picks")
     if isinstance(picks, list) and picks:
-        slots_seen = [p.get("slot") for p in picks if isinstance(p, dict)]
-        if len(set(slots_seen)) != len(slots_seen):
-            raise OutputValidationError(f"duplicate slot names in picks: {slots_seen}")
+        slots_seen: set[Any] = set()
+        for i, p in enumerate(picks):
+            if not isinstance(p, dict):
+                continue
+            slot_name = p.get("slot")
+            if slot_name in slots_seen:
+                raise OutputValidationError(
+                    f"duplicate slot names in picks: pick[{i}] slot={slot_name}"
+                )
+            slots_seen.add(slot_name)
 
 
 def _is_dev_seed_item(item: dict[str, Any]) -> bool:
@@ -155,17 +232,36 @@ def _assert_historical_archive_json_unchanged(
             )
 
 
+# 进程内 index 缓存：key=路径，value=(mtime_ns, size, 解析结果)；文件被外部改动时 stat 对不上即失效
+_INDEX_CACHE: dict[str, tuple[int, int, dict[str, Any]]] = {}
+
+
+def _remember_index(index_path: Path, index_obj: dict[str, Any]) -> None:
+    try:
+        st = index_path.stat()
+    except OSError:
+        _INDEX_CACHE.pop(str(index_path), None)
+        return
+    _INDEX_CACHE[str(index_path)] = (st.st_mtime_ns, st.st_size, copy.deepcopy(index_obj))
+
+
 def _load_index(index_path: Path, output_schema_version: str) -> dict[str, Any]:
-    if not index_path.exists():
+    try:
+        st = index_path.stat()
+    except OSError:
         return {"output_schema_version": output_schema_version, "items": []}
+    cached = _INDEX_CACHE.get(str(index_path))
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return copy.deepcopy(cached[2])
     try:
         text = index_path.read_text(encoding="utf-8-sig")
         index_obj = json.loads(text) if text.strip() else {}
         if not isinstance(index_obj, dict) or not isinstance(index_obj.get("items", []), list):
             raise ValueError("bad index schema")
-        return index_obj
     except Exception:
         return {"output_schema_version": output_schema_version, "items": []}
+    _remember_index(index_path, index_obj)
+    return index_obj
 
 
 def _archive_paths_for_item(archive_dir: Path, item: dict[str, Any]) -> list[Path]:
@@ -315,30 +411,25 @@ def write_daily_artifacts(
         _ensure_locked_archive_path(archive_path, locked_bytes)
         _ensure_locked_archive_path(archive_flat_path, locked_bytes)
 
-    items = [
-        x
-        for x in items
-        if isinstance(x, dict)
-        and not _is_dev_seed_item(x)
-        and x.get("date") != date_key
-        and x.get("run_id") != issue["run_id"]
-    ]
+    # 单遍按日期去重：同一天只留 _sort_key 最大的一条（相等时保留先出现的）
+    run_id = issue["run_id"]
+    by_date: dict[str, dict[str, Any]] = {}
+    for x in items:
+        if not isinstance(x, dict) or _is_dev_seed_item(x):
+            continue
+        item_date = x.get("date")
+        if not isinstance(item_date, str) or item_date == date_key or x.get("run_id") == run_id:
+            continue
+        prev = by_date.get(item_date)
+        if prev is None or _sort_key(x) > _sort_key(prev):
+            by_date[item_date] = x
     if locked_bytes is not None and existing_item is not None:
-        items.append(existing_item)
+        by_date[date_key] = existing_item
     else:
-        items.append(_canonical_index_item(issue))
-
-    items.sort(key=_sort_key, reverse=True)
-    recent_items: list[dict[str, Any]] = []
-    seen_dates: set[str] = set()
-    for item in items:
-        item_date = item.get("date")
-        if not isinstance(item_date, str) or item_date in seen_dates:
-            continue
-        seen_dates.add(item_date)
-        recent_items.append(item)
-        if len(recent_items) >= retention_days:
-            break
+        by_date[date_key] = _canonical_index_item(issue)
+
+    recent_items = heapq.nlargest(retention_days, by_date.values(), key=_sort_key)
+    seen_dates = {item["date"] for item in recent_items}
     index_obj["archive_retention_days"] = retention_days
     index_obj["items"] = recent_items
     _prune_archive_files(archive_dir, seen_dates)
@@ -350,6 +441,7 @@ def write_daily_artifacts(
     )
 
     atomic_write_json(index_path, index_obj)
+    _remember_index(index_path, index_obj)
 
     quarantine_written = bool(quarantine_rows and locked_bytes is None)
     if quarantine_written:
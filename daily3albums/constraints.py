@@ -3,7 +3,7 @@ from __future__ import annotations
 import hashlib
 import json
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date
 from pathlib import Path
 from typing import Any
@@ -18,6 +18,31 @@ class HistoryIndex:
     album_keys: set[str]
     artist_last_seen: dict[str, str]
     style_last_seen: dict[str, str]
+    # 同样的最近出现日期换算成 date.toordinal()，冷却判断只需整数相减
+    artist_last_seen_ord: dict[str, int] = field(init=False)
+    style_last_seen_ord: dict[str, int] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.artist_last_seen_ord = _ordinals(self.artist_last_seen)
+        self.style_last_seen_ord = _ordinals(self.style_last_seen)
+
+
+def _ordinals(last_seen: dict[str, str]) -> dict[str, int]:
+    # 每个日期字符串只解析一次；无法解析的日期不参与冷却判断
+    cache: dict[str, int | None] = {}
+    out: dict[str, int] = {}
+    for key, day in last_seen.items():
+        if not day:
+            continue
+        if day not in cache:
+            try:
+                cache[day] = date.fromisoformat(day).toordinal()
+            except ValueError:
+                cache[day] = None
+        ordinal = cache[day]
+        if ordinal is not None:
+            out[key] = ordinal
+    return out
 
 
 def normalize_text(value: str) -> str:
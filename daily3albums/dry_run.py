@@ -5,6 +5,7 @@ import json
 import random
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Optional
@@ -315,6 +316,30 @@ def _pick_slots(items: list[ScoredCandidate]) -> dict[str, Optional[ScoredCandid
     return {"Headliner": headliner, "Lineage": lineage, "DeepCut": deepcut}
 
 
+_LASTFM_PAGE_WORKERS = 4
+
+
+def _fetch_lastfm_pages(broker, api_key: str, tag: str, pages: list[int]) -> list[list[Any]]:
+    """
+    并发拉取 Last.fm 多页（纯 I/O，GIL 不是瓶颈）。
+    首页先单独拉取：首页失败时直接抛出，不再发起后续页请求（与串行版本一致）。
+    其余页交给线程池；broker 内部按 host 串行限速，所以只是重叠 RTT，不会超出配额；
+    结果按页码顺序返回。
+    """
+    def _one(page: int) -> list[Any]:
+        return lastfm_tag_top_albums(broker, api_key, tag=tag, limit=50, page=page)
+
+    if not pages:
+        return []
+    first, rest = pages[0], pages[1:]
+    out = [_one(first)]
+    if len(rest) <= 1:
+        return out + [_one(p) for p in rest]
+    with ThreadPoolExecutor(max_workers=min(_LASTFM_PAGE_WORKERS, len(rest))) as ex:
+        out.extend(ex.map(_one, rest))
+    return out
+
+
 def run_dry_run(
     broker,
     env,
@@ -372,9 +397,8 @@ def run_dry_run(
 
     raw: list[Candidate] = []
     pages_fetched = 0
-    for p in lastfm_pages:
+    for tops in _fetch_lastfm_pages(broker, env.lastfm_api_key, tag, lastfm_pages):
         pages_fetched += 1
-        tops = lastfm_tag_top_albums(broker, env.lastfm_api_key, tag=tag, limit=50, page=p)
         for a in tops:
             c = Candidate(title=a.name, artist=a.artist, image_url=a.image_extralarge)
             c.sources.add("lastfm")
@@ -5,6 +5,7 @@ import json
 import os
 import random
 import sqlite3
+import threading
 import time
 from dataclasses import dataclass, field
 from pathlib import Path
@@ -56,7 +57,7 @@ def _get_adapter_logger(repo_root: Path) -> logging.Logger:
     logs_dir = repo_root / "logs"
     logs_dir.mkdir(parents=True, exist_ok=True)
     log_path = logs_dir / "adapters.log"
-    log_path.touch(exist_ok=True)
+    # FileHandler 以追加模式打开，文件不存在时自会创建，无需先 touch
     handler = logging.FileHandler(log_path, encoding="utf-8")
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
     handler.setFormatter(formatter)
@@ -157,6 +158,10 @@ class RequestBroker:
         self.conn.commit()
 
         self._host_last_ts: dict[str, float] = {}
+        # 允许多线程共用一个 broker：限速槽位、sqlite 连接、统计各自一把锁
+        self._rate_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
 
         self.client = httpx.Client(
             timeout=httpx.Timeout(
@@ -166,34 +171,51 @@ class RequestBroker:
                 write=self.write_timeout_s,
                 pool=self.pool_timeout_s,
             ),
+            # 整个命令复用一个连接池（keep-alive），Last.fm/MB 多次请求不重复 TLS 握手
+            limits=httpx.Limits(
+                max_connections=16, max_keepalive_connections=8, keepalive_expiry=30.0
+            ),
             follow_redirects=True,
         )
 
     def _record_stat(self, adapter_name: str | None, key: str, inc: int = 1) -> None:
+        with self._stats_lock:
+            self._record_stat_locked(adapter_name, key, inc)
+
+    def _record_stat_locked(self, adapter_name: str | None, key: str, inc: int = 1) -> None:
         adapter = adapter_name or "unknown"
-        bucket = self.stats.setdefault(adapter, {"requests": 0, "timeouts": 0, "retries": 0, "failures": 0})
+        bucket = self.stats.setdefault(
+            adapter, {"requests": 0, "timeouts": 0, "retries": 0, "failures": 0}
+        )
         bucket[key] = int(bucket.get(key, 0)) + inc
 
-    def _record_failure(self, adapter_name: str | None, status: int, *, cached: bool, non_fatal: bool) -> None:
-        self._record_stat(adapter_name, "failures")
-        self._record_stat(adapter_name, f"status_{int(status)}")
-        if cached:
-            self._record_stat(adapter_name, "cached_negative_used")
-        if non_fatal:
-            self._record_stat(adapter_name, "non_fatal_failures")
+    def _record_failure(
+        self, adapter_name: str | None, status: int, *, cached: bool, non_fatal: bool
+    ) -> None:
         adapter = adapter_name or "unknown"
-        self.last_failure[adapter] = {
-            "status": int(status),
-            "cached": bool(cached),
-            "non_fatal": bool(non_fatal),
-        }
+        # 计数与 last_failure 在同一把锁里更新：并发请求下 last_failure 是该 adapter
+        # 最后一次完整记录的失败（后写者覆盖），不会读到拼到一半的记录
+        with self._stats_lock:
+            self._record_stat_locked(adapter, "failures")
+            self._record_stat_locked(adapter, f"status_{int(status)}")
+            if cached:
+                self._record_stat_locked(adapter, "cached_negative_used")
+            if non_fatal:
+                self._record_stat_locked(adapter, "non_fatal_failures")
+            self.last_failure[adapter] = {
+                "status": int(status),
+                "cached": bool(cached),
+                "non_fatal": bool(non_fatal),
+            }
 
     def get_last_failure(self, adapter_name: str) -> dict[str, Any] | None:
-        payload = self.last_failure.get(adapter_name)
-        return dict(payload) if isinstance(payload, dict) else None
+        with self._stats_lock:
+            payload = self.last_failure.get(adapter_name)
+            return dict(payload) if isinstance(payload, dict) else None
 
     def get_stats_snapshot(self) -> dict[str, dict[str, int]]:
-        return {k: dict(v) for k, v in self.stats.items()}
+        with self._stats_lock:
+            return {k: dict(v) for k, v in self.stats.items()}
 
     def close(self) -> None:
         try:
@@ -201,6 +223,12 @@ class RequestBroker:
         finally:
             self.conn.close()
 
+    def __enter__(self) -> RequestBroker:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
     def _log(self, msg: str) -> None:
         if self.logger:
             self.logger(msg)
@@ -373,9 +401,12 @@ class RequestBroker:
         rps = max(pol.rate_limit_rps, 0.01)
         min_interval = 1.0 / rps
 
-        now = time.monotonic()
-        last = self._host_last_ts.get(host, 0.0)
-        wait = (last + min_interval) - now
+        # 在锁内预约下一个发送时刻，锁外 sleep：并发调用也严格按 host 串行限速
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._host_last_ts.get(host, 0.0) + min_interval)
+            self._host_last_ts[host] = slot
+        wait = slot - now
         if wait > 0:
             self._log(f"RATE_LIMIT host={host} sleep={wait:.3f}s")
             self._log_adapter_activity(
@@ -385,24 +416,25 @@ class RequestBroker:
                 sleep_s=wait,
             )
             time.sleep(wait)
-        self._host_last_ts[host] = time.monotonic()
 
     def _cache_key(self, url: str) -> str:
         return hashlib.sha256(url.encode("utf-8")).hexdigest()
 
     def _cache_get(self, key: str) -> Optional[dict]:
-        row = self.conn.execute(
-            "SELECT url,status,headers_json,body,created_at,expires_at FROM http_cache WHERE key=?",
-            (key,),
-        ).fetchone()
-        if not row:
-            return None
+        with self._db_lock:
+            row = self.conn.execute(
+                "SELECT url,status,headers_json,body,created_at,expires_at "
+                "FROM http_cache WHERE key=?",
+                (key,),
+            ).fetchone()
+            if not row:
+                return None
 
-        url, status, headers_json, body, created_at, expires_at = row
-        if _now_epoch() >= int(expires_at):
-            self.conn.execute("DELETE FROM http_cache WHERE key=?", (key,))
-            self.conn.commit()
-            return None
+            url, status, headers_json, body, created_at, expires_at = row
+            if _now_epoch() >= int(expires_at):
+                self.conn.execute("DELETE FROM http_cache WHERE key=?", (key,))
+                self.conn.commit()
+                return None
 
         return {
             "url": url,
@@ -416,14 +448,15 @@ class RequestBroker:
     def _cache_put(self, key: str, url: str, status: int, headers: dict, body: bytes, ttl_s: int) -> None:
         created = _now_epoch()
         expires = created + max(int(ttl_s), 1)
-        self.conn.execute(
-            """
-            INSERT OR REPLACE INTO http_cache(key,url,status,headers_json,body,created_at,expires_at)
-            VALUES(?,?,?,?,?,?,?)
-            """,
-            (key, url, int(status), json.dumps(headers, ensure_ascii=False), body, created, expires),
-        )
-        self.conn.commit()
+        with self._db_lock:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO http_cache(key,url,status,headers_json,body,created_at,expires_at)
+                VALUES(?,?,?,?,?,?,?)
+                """,
+                (key, url, int(status), json.dumps(headers, ensure_ascii=False), body, created, expires),
+            )
+            self.conn.commit()
 
     def get(
         self,
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from daily3albums import adapters
+
+
+@pytest.fixture(autouse=True)
+def _clear_musicbrainz_caches():
+    # MusicBrainz 查询结果缓存在进程内：每个测试前后清空，避免用例之间互相泄漏
+    adapters.clear_musicbrainz_caches()
+    yield
+    adapters.clear_musicbrainz_caches()
+
+
+def _fake_scored(i: int):
+    c = SimpleNamespace(
+        title=f"Album {i}", artist=f"Artist {i}", sources={"lastfm"}, source_ranks={"lastfm": i}
+    )
+    n = SimpleNamespace(
+        mb_release_group_id=f"rg-{i}",
+        first_release_date="2000-01-01",
+        primary_type="Album",
+        artist_mbids=[f"artist-{i}"],
+        confidence=1.0,
+    )
+    return SimpleNamespace(c=c, n=n, score=100 - i, reason="ok")
+
+
+def _fake_dry_run_result(offset: int = 0):
+    return {
+        "raw_candidate_count": 5,
+        "merged_candidate_count": 4,
+        "source_counts": {"lastfm": 4, "discogs": 0, "listenbrainz": 0, "multi_source": 0},
+        "prefilter_total": 3,
+        "prefilter_topn": 3,
+        "normalized_count": 3,
+        "normalization_success_count": 3,
+        "normalization_failed_count": 1,
+        "top": [_fake_scored(offset + 1), _fake_scored(offset + 2), _fake_scored(offset + 3)],
+        "lastfm_pages_fetched": 1,
+        "lastfm_pages_planned": 1,
+        "mb_candidates_considered": 3,
+        "mb_candidates_normalized": 3,
+        "mb_queries_attempted_total": 0,
+        "mb_search_queries_attempted_total": 0,
+        "mb_http_calls_total": 0,
+        "mb_budget_exceeded": False,
+        "mb_cap_hit": False,
+        "mb_time_spent_s": 0.01,
+        "discogs_enabled": False,
+        "discogs_attempted": False,
+        "discogs_pages_fetched": 0,
+        "discogs_page_cap_hit": False,
+        "discogs_failed_status": None,
+        "discogs_cached_negative_used": False,
+        "listenbrainz_attempted": True,
+        "listenbrainz_failed": False,
+        "listenbrainz_candidates": 0,
+    }
+
+
+@pytest.fixture
+def fake_dry_run_result():
+    # cmd_build 的测试共用：伪造 run_dry_run 的返回值，offset 用来让不同调用拿到不同专辑
+    return _fake_dry_run_result
@@ -0,0 +1,159 @@
+from daily3albums import adapters
+
+
+def test_mb_norm_text_ascii_and_unicode():
+    assert adapters._mb_norm_text("  Don't  Stop!! ") == "dont stop"
+    assert adapters._mb_norm_text("Ｆｕｌｌ　Ｗｉｄｔｈ") == "full width"
+    assert adapters._mb_norm_text("") == ""
+
+
+def test_clean_title_and_artist():
+    assert adapters._clean_title("Abbey Road (Remastered 2019)") == "Abbey Road"
+    assert adapters._clean_artist("Artist feat. Guest") == "Artist"
+
+
+def test_ratio_bounds():
+    assert adapters._ratio("Nebula Drift", "nebula drift") == 1.0
+    assert adapters._ratio("", "x") == 0.0
+    assert 0.0 < adapters._ratio("Nebula Drift", "Nebula Drifts") < 1.0
+
+
+def test_best_match_skips_duplicate_queries(monkeypatch):
+    seen: list[str] = []
+
+    def _fake_search(_broker, mb_user_agent, query, limit=10):
+        seen.append(query)
+        return []
+
+    monkeypatch.setattr(adapters, "musicbrainz_search_release_group_by_query", _fake_search)
+    best, _, dbg = adapters.musicbrainz_best_release_group_match_debug(
+        None,
+        mb_user_agent="ua",
+        title="Nebula Drift",
+        artist="Echo Unit",
+        max_queries_per_candidate=4,
+    )
+
+    assert best is None
+    assert len(seen) == len(set(seen)) == 3
+    assert not any(line.startswith("search:clean_strict") for line in dbg)
+
+
+def test_pick_lastfm_image_prefers_size_then_largest():
+    images = [
+        {"#text": "https://x/s.jpg", "size": "small"},
+        {"#text": "https://x/l.jpg", "size": "large"},
+        {"#text": "", "size": "mega"},
+    ]
+    assert adapters._pick_lastfm_image(images) == "https://x/l.jpg"
+    images.insert(2, {"#text": " https://x/xl.jpg ", "size": "extralarge"})
+    assert adapters._pick_lastfm_image(images) == "https://x/xl.jpg"
+    assert adapters._pick_lastfm_image(None) is None
+
+
+def test_pick_lastfm_image_strips_size_and_keeps_first_match():
+    images = [
+        {"#text": "https://x/first.jpg", "size": " extralarge "},
+        {"#text": "https://x/second.jpg", "size": "extralarge"},
+        {"#text": "https://x/mega.jpg", "size": "mega"},
+    ]
+    assert adapters._pick_lastfm_image(images) == "https://x/first.jpg"
+    assert adapters._pick_lastfm_image(images, prefer_size="huge") == "https://x/mega.jpg"
+
+
+def test_score_candidate_type_adjustments():
+    rg = adapters.MbReleaseGroup(
+        id="rg-1",
+        title="Nebula Drift",
+        artist_credit="Echo Unit",
+        artist_mbids=[],
+        first_release_date=None,
+        primary_type="Album",
+        secondary_types=["Compilation", "Live"],
+    )
+    conf, title_sim, artist_sim, note = adapters._score_release_group_candidate(
+        "nebula drift", "echo unit", rg
+    )
+
+    assert title_sim == artist_sim == 1.0
+    assert abs(conf - (1.0 + 0.05 - 0.12 - 0.08)) < 1e-9
+    assert note == "pt:album:+0.05,st:compilation:-0.12,st:live:-0.08"
+
+
+def test_artist_ratio_tolerates_reordered_credits_but_not_subsets():
+    assert adapters._ratio_artist_norm("alpha beta", "beta alpha") == 1.0
+    assert adapters._ratio_artist_norm("echo", "echo unit") < 1.0
+
+
+def test_maybe_int():
+    assert adapters._maybe_int("42") == 42
+    assert adapters._maybe_int(7) == 7
+    assert adapters._maybe_int("") is None
+    assert adapters._maybe_int("n/a") is None
+    assert adapters._maybe_int(None) is None
+    assert adapters._maybe_int("-5") is None
+    assert adapters._maybe_int(" 12 ") is None
+    assert adapters._maybe_int("1_000") is None
+
+
+def test_ratio_fallback_without_rapidfuzz(monkeypatch):
+    monkeypatch.setattr(adapters, "_rf_ratio", None)
+
+    assert adapters._ratio("Nebula Drift", "nebula drift") == 1.0
+    assert 0.0 < adapters._ratio("Nebula Drift", "Nebula Drifts") < 1.0
+    assert adapters._ratio_norm("abc", "xyz") == 0.0
+
+
+def test_ratio_fallback_matches_sequence_matcher_orientation(monkeypatch):
+    from difflib import SequenceMatcher
+
+    monkeypatch.setattr(adapters, "_rf_ratio", None)
+    long_a = "echo unit " * 30 + "nebula"
+    long_b = "echo unit " * 29 + "nebula drift"
+    pairs = [("bca", "abaa"), ("abaa", "bca"), (long_a, long_b), ("nebula drift", "nebula")]
+    for a, b in pairs:
+        assert adapters._ratio_norm(a, b) == SequenceMatcher(None, a, b).ratio()
+    assert round(adapters._ratio_norm("bca", "abaa"), 3) == 0.571
+
+
+def test_mb_search_url_matches_urlencode_format():
+    from urllib.parse import quote_plus, urlencode
+
+    q = 'releasegroup:"Café / Ünïcode & Co" AND artist:"A+B"'
+    expected = "https://musicbrainz.org/ws/2/release-group?" + urlencode(
+        {"query": q, "fmt": "json", "limit": "10"}, quote_via=quote_plus
+    )
+    assert adapters._mb_search_url(q, 10) == expected
+
+
+class _CountingBroker:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    def get_json(self, url, headers=None, adapter_name=None):
+        self.calls += 1
+        return self.payload
+
+
+def test_release_group_cache_keeps_misses_and_clears():
+    broker = _CountingBroker({"title": "no id"})
+    miss = (None, "rg:missing-id")
+    assert adapters.musicbrainz_get_release_group_debug(broker, "ua", "rg-x") == miss
+    assert adapters.musicbrainz_get_release_group(broker, "ua", "rg-x") is None
+    assert adapters.musicbrainz_get_release_group_debug(broker, "ua", "rg-x") == miss
+    assert broker.calls == 1
+
+    adapters.clear_musicbrainz_caches()
+    adapters.musicbrainz_get_release_group(broker, "ua", "rg-x")
+    assert broker.calls == 2
+
+
+def test_bounded_memo_evicts_least_recently_used():
+    memo = adapters._BoundedMemo(maxsize=2)
+    memo.put("a", None)
+    memo.put("b", 2)
+    assert memo.get("a") is None
+    memo.put("c", 3)
+    assert memo.get("b") is adapters._MISS
+    assert memo.get("a") is None and memo.get("c") == 3
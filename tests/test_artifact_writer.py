@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import shutil
 from pathlib import Path
 
 import pytest
@@ -288,3 +289,46 @@ def test_writer_fails_if_kept_historical_archive_json_changes(tmp_path: Path, mo
             _issue("2026-06-25", "new-day", "2026-06-25T06:00:00+08:00"),
             out_public_dir=out,
         )
+
+
+def test_atomic_write_json_format_is_stable(tmp_path: Path):
+    payload = {"b": [1, 2.5, {"z": "中文", "a": None}], "a": True, "c": {}}
+    target = tmp_path / "out" / "data.json"
+
+    artifact_writer.atomic_write_json(target, payload)
+
+    expected = json.dumps(payload, ensure_ascii=False, indent=2, sort_keys=True) + "\n"
+    assert target.read_bytes() == expected.encode("utf-8")
+    assert not target.with_suffix(".json.tmp").exists()
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"b": [1, 2.5, None, True, {"z": "ポスト \x1f\"\\/"}], "a": {}, "c": [], "d": -0.0},
+        {"big": 2**63, "neg": -(2**63), "t": (1, 2), "f": 123456789012345.6},
+        {"nan": float("nan"), "inf": float("inf")},
+        {"huge": 2**70},
+        {"exp": 1e20, "tiny": 1e-7},
+        {2: "two", 10: "ten"},
+    ],
+)
+def test_dumps_json_bytes_matches_stdlib(payload):
+    expected = json.dumps(payload, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8")
+    assert artifact_writer._dumps_json_bytes(payload) == expected
+
+
+def test_orjson_fast_path_only_for_stdlib_compatible_payloads():
+    assert artifact_writer._orjson_matches_stdlib({"a": [1, 2.5, None, {"b": "x"}]})
+    for payload in ({"n": float("nan")}, {"i": 2**70}, {"f": 1e20}, {1: 2}, {"d": Path(".")}):
+        assert not artifact_writer._orjson_matches_stdlib(payload)
+
+
+def test_atomic_write_recreates_pruned_parent_dir(tmp_path: Path):
+    target = tmp_path / "archive" / "2026-01-01" / "run.json"
+    artifact_writer.atomic_write_json(target, {"a": 1})
+    shutil.rmtree(target.parent)
+
+    artifact_writer.atomic_write_bytes(target, b"{}\n")
+
+    assert target.read_bytes() == b"{}\n"
@@ -0,0 +1,144 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from daily3albums import cli
+from daily3albums.config import AppConfig
+
+
+def _build_config(tag_pool: list[str], max_tag_tries_per_slot: int) -> AppConfig:
+    return AppConfig(
+        raw={"tag_pool": tag_pool},
+        policies={},
+        timezone="Asia/Shanghai",
+        lastfm_page_start=1,
+        lastfm_max_pages=6,
+        max_tag_tries_per_slot=max_tag_tries_per_slot,
+        mb_max_queries_per_candidate=3,
+        mb_max_candidates_per_slot=120,
+        mb_time_budget_s_per_slot=90.0,
+        coarse_top_n_per_slot=120,
+        discogs_enabled=False,
+        discogs_page_start=1,
+        discogs_max_pages=3,
+        discogs_per_page=100,
+        decade_mode="off",
+        ignored_legacy_decade_keys=[],
+        ui_build_timeout_s=300,
+        archive_retention_days=7,
+    )
+
+
+def _run_build(repo_root: Path, n: int = 30) -> int:
+    return cli.cmd_build(
+        repo_root=repo_root,
+        tag="auto",
+        n=n,
+        topk=10,
+        verbose=False,
+        split_slots=True,
+        mb_search_limit=10,
+        min_confidence=0.8,
+        ambiguity_gap=0.06,
+        mb_debug=False,
+        quarantine_out="",
+        out_dir=str(repo_root / "public"),
+        date_override="",
+        theme="",
+        diagnostics=False,
+        skip_ui_build=True,
+    )
+
+
+def _patch_build_inputs(monkeypatch, repo_root: Path) -> None:
+    (repo_root / "ui" / "dist").mkdir(parents=True)
+    monkeypatch.setattr(
+        cli,
+        "load_env",
+        lambda _root: SimpleNamespace(lastfm_api_key="k", mb_user_agent="ua", discogs_token=None),
+    )
+    cfg = _build_config(["fixture-a", "fixture-b", "fixture-c"], max_tag_tries_per_slot=3)
+    monkeypatch.setattr(cli, "load_config", lambda _root: cfg)
+
+
+def test_cmd_build_skips_wider_fetch_window_when_identity_filters_reject_all(
+    monkeypatch, tmp_path: Path, fake_dry_run_result
+):
+    _patch_build_inputs(monkeypatch, tmp_path)
+    calls = []
+
+    def fake_run_dry_run(*args, **kwargs):
+        calls.append((kwargs["seed_key"], kwargs["n"]))
+        return fake_dry_run_result()
+
+    monkeypatch.setattr(cli, "run_dry_run", fake_run_dry_run)
+
+    rc = _run_build(tmp_path)
+
+    # slot 0 用掉同一批专辑后，slot 1 的候选全被 album_collision 拒掉：每个 tag 只抓一次默认窗口
+    assert rc == 2
+    slot1_calls = [n for seed_key, n in calls if seed_key.split(":")[1] == "1"]
+    assert slot1_calls == [200, 200, 200]
+
+
+@pytest.mark.parametrize(
+    ("slot1_offsets", "expected_windows"),
+    [
+        # top 全是 slot 0 已选专辑：即使合并池远大于 top，也应直接换 tag
+        ((0, 1, 2), [200, 200, 200]),
+        # top 里大多数候选存活（只是不够 3 张）：仍要扩大窗口再试
+        ((0, 49, 50), [200, 400, 200, 400, 200, 400]),
+    ],
+)
+def test_fetch_window_skip_compares_against_normalized_candidates(
+    monkeypatch, tmp_path: Path, fake_dry_run_result, slot1_offsets, expected_windows
+):
+    _patch_build_inputs(monkeypatch, tmp_path)
+    calls = []
+
+    def fake_run_dry_run(*args, **kwargs):
+        slot = kwargs["seed_key"].split(":")[1]
+        calls.append((slot, kwargs["n"]))
+        out = fake_dry_run_result()
+        if slot != "0":
+            out["top"] = [fake_dry_run_result(offset)["top"][0] for offset in slot1_offsets]
+        # 合并池（截断前）远大于进入身份过滤的 top
+        out["prefilter_total"] = 500
+        return out
+
+    monkeypatch.setattr(cli, "run_dry_run", fake_run_dry_run)
+
+    rc = _run_build(tmp_path)
+
+    assert rc == 2
+    assert [n for slot, n in calls if slot == "1"] == expected_windows
+
+
+@pytest.mark.parametrize(
+    ("n", "expected_windows"),
+    [(30, [200, 400]), (400, [400]), (500, [500])],
+)
+def test_fetch_windows_never_shrink_after_the_first(
+    monkeypatch, tmp_path: Path, fake_dry_run_result, n, expected_windows
+):
+    _patch_build_inputs(monkeypatch, tmp_path)
+    calls = []
+
+    def fake_run_dry_run(*args, **kwargs):
+        slot, tag = kwargs["seed_key"].split(":")[1:3]
+        calls.append((slot, tag, kwargs["n"]))
+        out = fake_dry_run_result()
+        if slot != "0":
+            # 只有一张新专辑：过滤不是主要原因，每个 tag 都会走完全部窗口
+            out["top"] = [fake_dry_run_result(offset)["top"][0] for offset in (49, 0)]
+        return out
+
+    monkeypatch.setattr(cli, "run_dry_run", fake_run_dry_run)
+
+    rc = _run_build(tmp_path, n=n)
+
+    assert rc == 2
+    slot1_tags = dict.fromkeys(tag for slot, tag, _ in calls if slot == "1")
+    for tag in slot1_tags:
+        assert [w for slot, t, w in calls if slot == "1" and t == tag] == expected_windows
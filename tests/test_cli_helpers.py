@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+import pytest
+
+import daily3albums.cli as cli
+from daily3albums.adapters import MbReleaseGroup
+
+
+def test_cli_import_does_not_load_network_stack():
+    code = (
+        "import sys, daily3albums.cli; "
+        "print(int('httpx' in sys.modules), int('daily3albums.dry_run' in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["0", "0"]
+
+
+def test_cli_lazy_names_resolve_as_module_attributes():
+    from daily3albums.dry_run import run_dry_run
+
+    assert cli.run_dry_run is run_dry_run
+    cli._load_network_stack()
+    assert "RequestBroker" in vars(cli)
+
+
+def test_probe_stack_does_not_import_dry_run():
+    code = (
+        "import sys, daily3albums.cli as cli; cli._load_network_stack(*cli._PROBE_STACK); "
+        "print(int('httpx' in sys.modules), int('daily3albums.dry_run' in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["1", "0"]
+
+
+def test_bare_doctor_dispatch_does_not_import_argparse():
+    code = (
+        "import sys, daily3albums.cli as cli; cli.cmd_doctor = lambda root, quick=False: 0\n"
+        "try:\n    cli.main(['doctor', '--quick'])\nexcept SystemExit:\n    pass\n"
+        "print(int('argparse' in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["0"]
+
+
+def _subcommand_choices(parser) -> set[str]:
+    sub = next(a for a in parser._actions if a.dest == "cmd")
+    return set(sub.choices)
+
+
+def test_arg_parser_builds_only_invoked_subcommand():
+    assert _subcommand_choices(cli._build_arg_parser(["dry-run", "--tag", "x"])) == {"dry-run"}
+    assert _subcommand_choices(cli._build_arg_parser(["--help"])) == set(cli._SUBPARSER_BUILDERS)
+    assert _subcommand_choices(cli._build_arg_parser(["bogus"])) == set(cli._SUBPARSER_BUILDERS)
+
+
+def test_dumps_pretty_matches_stdlib_layout():
+    payload = [{"name": "Nebula Drift", "artist": "Ｅcho", "rank": 1, "tags": None}]
+    expected = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+    assert cli._dumps_pretty(payload) == expected
+
+
+def test_dumps_pretty_encodes_dataclasses_by_public_fields():
+    rg = MbReleaseGroup(
+        id="rg-1",
+        title="T",
+        artist_credit="A",
+        artist_mbids=[],
+        first_release_date=None,
+        primary_type="Album",
+        secondary_types=["Live"],
+    )
+    decoded = json.loads(cli._dumps_pretty([rg]))
+    assert decoded == [
+        {
+            "id": "rg-1",
+            "title": "T",
+            "artist_credit": "A",
+            "artist_mbids": [],
+            "first_release_date": None,
+            "primary_type": "Album",
+            "secondary_types": ["Live"],
+        }
+    ]
+
+
+def test_main_dispatches_doctor_without_argparse(monkeypatch):
+    def _fail(argv):
+        raise AssertionError(f"doctor must not build the argparse tree: {argv}")
+
+    calls = []
+    monkeypatch.setattr(cli, "cmd_doctor", lambda root, quick=False: calls.append(quick) or 0)
+    monkeypatch.setattr(cli, "_build_arg_parser", _fail)
+
+    for argv in (["doctor"], ["doctor", "--quick"]):
+        with pytest.raises(SystemExit) as exc:
+            cli.main(argv)
+        assert exc.value.code == 0
+    assert calls == [False, True]
+
+
+def test_lastfm_raw_url_matches_urlencode():
+    for tag, key in (("post-rock", "k1"), ("hip hop & r&b/ñ", "a+b c"), ("x", None)):
+        params = {
+            "method": "tag.getTopAlbums",
+            "tag": tag,
+            "limit": "25",
+            "page": "1",
+            "api_key": key,
+            "format": "json",
+        }
+        expected = "https://ws.audioscrobbler.com/2.0/?" + urlencode(params)
+        assert cli._lastfm_raw_url(tag, 25, key) == expected
+
+
+def test_main_maps_build_options_onto_cmd_build(monkeypatch):
+    seen = {}
+    monkeypatch.setattr(cli, "cmd_build", lambda root, **kw: seen.update(kw) or 0)
+
+    with pytest.raises(SystemExit) as exc:
+        cli.main(["build", "--tag", "rock", "--out", "x/public", "--date", "2026-01-02"])
+    assert exc.value.code == 0
+    assert seen["out_dir"] == "x/public"
+    assert seen["date_override"] == "2026-01-02"
+    assert seen["split_slots"] is True
+    assert "cmd" not in seen and "func" not in seen
+
+
+def test_main_reports_interrupt_for_dry_run(monkeypatch):
+    def _interrupted(root, **kw):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli, "cmd_dry_run", _interrupted)
+    with pytest.raises(SystemExit) as exc:
+        cli.main(["dry-run", "--tag", "rock"])
+    assert exc.value.code == 130
+
+
+def test_read_quarantine_jsonl_skips_blank_and_broken_lines(tmp_path):
+    path = tmp_path / "q.jsonl"
+    path.write_text('{"artist": "Ｅcho"}\n\nnot json\n  {"title": "Nebula"}  \n', encoding="utf-8")
+
+    assert cli._read_quarantine_jsonl(path) == [{"artist": "Ｅcho"}, {"title": "Nebula"}]
+    assert cli._read_quarantine_jsonl(tmp_path / "missing.jsonl") == []
+
+    path.write_bytes(b'{"a": 1}\r{"b": 2}\r\n')
+    assert cli._read_quarantine_jsonl(path) == [{"a": 1}, {"b": 2}]
+
+
+def test_load_recent_stable_ids_reads_index_and_archives(tmp_path):
+    data = tmp_path / "data"
+    (data / "archive" / "2026-01-02").mkdir(parents=True)
+    index = {
+        "items": [
+            {"date": "2026-01-01", "run_at": "2026-01-01T00:00:00"},
+            {"date": "2026-01-02", "run_id": "r2", "run_at": "2026-01-02T00:00:00"},
+        ]
+    }
+    (data / "index.json").write_text(json.dumps(index), encoding="utf-8")
+    (data / "archive" / "2026-01-02" / "r2.json").write_text(
+        json.dumps({"picks": [{"rg_mbid": "rg-2"}, {"rg_mbid": ""}]}), encoding="utf-8"
+    )
+    (data / "archive" / "2026-01-01.json").write_text(
+        json.dumps({"picks": [{"rg_mbid": "rg-1"}]}), encoding="utf-8"
+    )
+
+    assert cli._load_recent_stable_ids(tmp_path, max_runs=9) == ["rg-2", "rg-1"]
+    assert cli._load_recent_stable_ids(tmp_path, max_runs=1) == ["rg-2"]
+
+
+def test_read_json_cached_reloads_rewritten_file(tmp_path):
+    path = tmp_path / "index.json"
+    path.write_text('{"items": []}', encoding="utf-8")
+    first = cli._read_json_if_exists(path)
+    assert cli._read_json_if_exists(path) is first
+
+    path.write_text('{"items": [{"date": "2026-01-01"}]}', encoding="utf-8")
+    assert cli._read_json_if_exists(path) == {"items": [{"date": "2026-01-01"}]}
+    assert cli._read_json_if_exists(tmp_path / "missing.json") is None
+
+
+def test_hash_index_is_stable_sha256_bucket():
+    for seed in ("2026-01-02:0", "2026-01-02:2", "季节"):
+        for size in (1, 7, 12):
+            expected = int(hashlib.sha256(seed.encode("utf-8")).hexdigest(), 16) % size
+            assert cli._hash_index(seed, size) == expected
+    assert cli._hash_index("x", 0) == 0
+
+
+def test_pick_weighted_index_matches_linear_scan():
+    def _linear(weights, rng):
+        total = sum(weights)
+        if total <= 0:
+            return None
+        r = rng.random() * total
+        upto = 0.0
+        for idx, weight in enumerate(weights):
+            upto += weight
+            if upto >= r:
+                return idx
+        return None
+
+    gen = random.Random(7)
+    for seed in range(200):
+        weights = [gen.random() ** 3 for _ in range(gen.randint(0, 12))]
+        if weights and seed % 5 == 0:
+            weights[0] = 0.0
+        expected = _linear(weights, random.Random(seed))
+        assert cli._pick_weighted_index(weights, random.Random(seed)) == expected
+    assert cli._pick_weighted_index([0.0, 0.0], random.Random(1)) is None
+
+
+def test_artist_identity_normalizes_credit_and_mbids():
+    item = SimpleNamespace(
+        n=SimpleNamespace(artist_mbids=[" a1 ", "", "a1", "b2"]),
+        c=SimpleNamespace(artist="  Echo   Unit feat. Someone Else "),
+    )
+    assert cli._artist_identity(item) == ({"a1", "b2"}, "echo unit")
+    assert cli._normalize_artist_credit("Pulse\tArray ft. X") == "pulse array"
+
+
+def test_copy_tree_overwrite_skips_unchanged_and_replaces_edited(tmp_path):
+    src = tmp_path / "src"
+    (src / "assets").mkdir(parents=True)
+    (src / "index.html").write_text("v1", encoding="utf-8")
+    (src / "assets" / "app.js").write_text("js", encoding="utf-8")
+    (src / "empty" / "nested").mkdir(parents=True)
+    dst = tmp_path / "dst"
+
+    cli._copy_tree_overwrite(src, dst)
+    assert (dst / "assets" / "app.js").read_text(encoding="utf-8") == "js"
+    assert (dst / "empty" / "nested").is_dir()
+    assert cli._same_copied_file(src / "index.html", dst / "index.html")
+
+    (dst / "index.html").write_text("v2", encoding="utf-8")
+    os.utime(dst / "index.html", ns=(0, 0))
+    cli._copy_tree_overwrite(src, dst)
+    assert (dst / "index.html").read_text(encoding="utf-8") == "v1"
+
+
+def test_ensure_nonblank_index_html_only_replaces_missing_or_empty(tmp_path):
+    cli._ensure_nonblank_index_html(tmp_path, tmp_path / "web")
+    builtin = (tmp_path / "index.html").read_text(encoding="utf-8")
+    assert "Daily 3 Albums" in builtin
+
+    (tmp_path / "index.html").write_text("", encoding="utf-8")
+    cli._ensure_nonblank_index_html(tmp_path, tmp_path / "web")
+    assert (tmp_path / "index.html").read_text(encoding="utf-8") == builtin
+
+    (tmp_path / "index.html").write_text("<html>app</html>", encoding="utf-8")
+    cli._ensure_nonblank_index_html(tmp_path, tmp_path / "web")
+    assert (tmp_path / "index.html").read_text(encoding="utf-8") == "<html>app</html>"
+
+
+def test_zoneinfo_is_cached_and_tolerates_unknown_names():
+    assert cli._zoneinfo("Asia/Shanghai") is cli._zoneinfo("Asia/Shanghai")
+    assert cli._zoneinfo("Not/AZone") is None
+    assert cli._beijing_now().utcoffset().total_seconds() == 8 * 3600
+    assert len(cli._now_date_in_tz("Not/AZone")) == 10
+
+
+def test_newest_first_matches_full_sort_order():
+    gen = random.Random(3)
+    items = [{"k": gen.randint(0, 20), "i": i} for i in range(60)]
+    key = lambda item: item["k"]  # noqa: E731
+    expected = sorted(items, key=key, reverse=True)
+    for head in (0, 1, 5, 27, 60, 100):
+        assert list(cli._newest_first(items, key=key, head=head)) == expected
+
+
+def test_prefetch_covers_fetches_each_release_group_once():
+    calls = []
+    lock = threading.Lock()
+
+    class _Adapter:
+        def fetch_cover(self, rg_id):
+            with lock:
+                calls.append(rg_id)
+            return f"cover:{rg_id}"
+
+    covers = cli._prefetch_covers(_Adapter(), ["rg-1", "", "rg-2", "rg-1", "rg-3"])
+    assert covers == {"rg-1": "cover:rg-1", "rg-2": "cover:rg-2", "rg-3": "cover:rg-3"}
+    assert sorted(calls) == ["rg-1", "rg-2", "rg-3"]
+
+
+def test_blocked_primary_types_follow_allow_flags():
+    assert cli._blocked_primary_types({}) == {"compilation", "live", "ep", "single"}
+    flags = {"album": False, "compilation": True, "live": False, "ep": True, "single": False}
+    assert cli._blocked_primary_types(flags) == {"album", "live", "single"}
+
+
+def test_wait_ui_build_replays_captured_output(capfd):
+    output = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", "import sys; print('npm out'); print('npm err', file=sys.stderr)"],
+        stdout=output,
+        stderr=subprocess.STDOUT,
+    )
+    assert cli._wait_ui_build(proc, output, timeout_s=30) == 0
+    cli._stop_ui_build(proc, output)
+    captured = capfd.readouterr().out
+    assert "npm out" in captured and "npm err" in captured
+    assert output.closed
+
+
+def test_dumps_line_is_single_line_unicode_json():
+    payload = {"slot_id": 1, "tag": "ポスト・ロック", "reject_counts": {"va": 2}, "ratio": 0.25}
+    line = cli._dumps_line(payload)
+    assert "\n" not in line and "ポスト・ロック" in line
+    assert json.loads(line) == payload
+
+
+def test_history_index_cache_reuses_until_archive_changes(tmp_path, monkeypatch):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    pick = {"rg_mbid": "rg-1", "artist_keys": ["a-1"]}
+    issue = {"slots": [{"theme_key": "techno", "picks": [pick]}]}
+    (archive / "2026-01-18.json").write_text(json.dumps(issue), encoding="utf-8")
+    state = tmp_path / ".state"
+
+    def _load():
+        return cli._load_history_index_cached(
+            state, archive, current_date_key="2026-01-20", max_lookback_days=14
+        )
+
+    def _fail(*_args, **_kwargs):
+        raise AssertionError("history index should come from the cache")
+
+    first = _load()
+    assert first.artist_last_seen == {"a-1": "2026-01-18"}
+    assert (state / "history_index.pkl").exists()
+
+    monkeypatch.setattr(cli, "load_history_index", _fail)
+    cached = _load()
+    assert cached.artist_last_seen_ord == first.artist_last_seen_ord
+    monkeypatch.undo()
+
+    (archive / "2026-01-19.json").write_text(json.dumps(issue), encoding="utf-8")
+    rebuilt = _load()
+    assert rebuilt.artist_last_seen == {"a-1": "2026-01-19"}
+
+
+def test_prepare_weighted_candidates_dedupes_and_cools_recent():
+    def _item(rg, score):
+        return SimpleNamespace(n=SimpleNamespace(mb_release_group_id=rg), score=score)
+
+    items = [_item("rg-1", 90.0), _item("", 80.0), _item("rg-2", 90.0), _item("rg-1", 70.0)]
+    candidates, weights, hits = cli._prepare_weighted_candidates(items, {"rg-2"}, 0.5, 10.0)
+    assert candidates == [items[0], items[2]]
+    assert hits == 1
+    assert weights == [0.5, 0.25]
+
+
+def test_copy_tree_overwrite_skips_only_top_level_dirs(tmp_path):
+    src = tmp_path / "dist"
+    (src / "data").mkdir(parents=True)
+    (src / "data" / "today.json").write_text("{}", encoding="utf-8")
+    (src / "assets" / "data").mkdir(parents=True)
+    (src / "assets" / "data" / "x.json").write_text("{}", encoding="utf-8")
+    dst = tmp_path / "public"
+    (dst / "data").mkdir(parents=True)
+
+    cli._copy_tree_overwrite(src, dst, skip_top_level_dirs={"data"})
+    assert not (dst / "data" / "today.json").exists()
+    assert (dst / "assets" / "data" / "x.json").exists()
+
+
+def test_copy_tree_overwrite_does_not_follow_directory_symlinks(tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "secret.txt").write_text("x", encoding="utf-8")
+    src = tmp_path / "dist"
+    src.mkdir()
+    (src / "linked").symlink_to(outside, target_is_directory=True)
+    (src / "page.html").symlink_to(outside / "secret.txt")
+    dst = tmp_path / "public"
+
+    cli._copy_tree_overwrite(src, dst)
+    # 与 os.walk 一致：目录软链接只建同名空目录，文件软链接拷贝内容
+    assert (dst / "linked").is_dir() and not (dst / "linked").is_symlink()
+    assert list((dst / "linked").iterdir()) == []
+    assert not (dst / "page.html").is_symlink()
+    assert (dst / "page.html").read_text(encoding="utf-8") == "x"
+
+
+def test_dry_run_closes_broker_when_config_conversion_fails(monkeypatch, tmp_path):
+    closed = []
+
+    class _Broker:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            closed.append(True)
+            return False
+
+    cfg = SimpleNamespace(raw={}, coarse_top_n_per_slot="not-a-number")
+    monkeypatch.setattr(cli, "_setup", lambda *a: (SimpleNamespace(), cfg, _Broker()))
+
+    with pytest.raises(ValueError):
+        cli.cmd_dry_run(
+            tmp_path, tag="x", n=1, topk=1, verbose=False, split_slots=False,
+            mb_search_limit=1, min_confidence=0.8, ambiguity_gap=0.06, mb_debug=False,
+            quarantine_out="", diagnostics=False,
+        )
+    assert closed == [True]
@@ -3,77 +3,50 @@ from types import SimpleNamespace
 from pathlib import Path
 import subprocess
 
+import pytest
+
 from daily3albums import cli
 
 
-def _fake_scored(i: int):
-    c = SimpleNamespace(title=f"Album {i}", artist=f"Artist {i}", sources={"lastfm"}, source_ranks={"lastfm": i})
-    n = SimpleNamespace(
-        mb_release_group_id=f"rg-{i}",
-        first_release_date="2000-01-01",
-        primary_type="Album",
-        artist_mbids=[f"artist-{i}"],
-        confidence=1.0,
-    )
-    return SimpleNamespace(c=c, n=n, score=100 - i, reason="ok")
-
-
-def _fake_dry_run_result(offset: int = 0):
-    return {
-        "raw_candidate_count": 5,
-        "merged_candidate_count": 4,
-        "source_counts": {"lastfm": 4, "discogs": 0, "listenbrainz": 0, "multi_source": 0},
-        "prefilter_total": 3,
-        "prefilter_topn": 3,
-        "normalized_count": 3,
-        "normalization_success_count": 3,
-        "normalization_failed_count": 1,
-        "top": [_fake_scored(offset + 1), _fake_scored(offset + 2), _fake_scored(offset + 3)],
-        "lastfm_pages_fetched": 1,
-        "lastfm_pages_planned": 1,
-        "mb_candidates_considered": 3,
-        "mb_candidates_normalized": 3,
-        "mb_queries_attempted_total": 0,
-        "mb_search_queries_attempted_total": 0,
-        "mb_http_calls_total": 0,
-        "mb_budget_exceeded": False,
-        "mb_cap_hit": False,
-        "mb_time_spent_s": 0.01,
-        "discogs_enabled": False,
-        "discogs_attempted": False,
-        "discogs_pages_fetched": 0,
-        "discogs_page_cap_hit": False,
-        "discogs_failed_status": None,
-        "discogs_cached_negative_used": False,
-        "listenbrainz_attempted": True,
-        "listenbrainz_failed": False,
-        "listenbrainz_candidates": 0,
-    }
-
-
-def test_cmd_build_ui_timeout_returns_nonzero(monkeypatch, tmp_path: Path):
-    repo_root = Path(__file__).resolve().parents[1]
-    (repo_root / "ui").mkdir(exist_ok=True)
+def test_cmd_build_ui_timeout_returns_nonzero(monkeypatch, tmp_path: Path, fake_dry_run_result):
+    repo_root = tmp_path
+    (repo_root / "ui").mkdir()
 
     monkeypatch.setattr(
         cli,
         "load_env",
         lambda _root: SimpleNamespace(lastfm_api_key="k", mb_user_agent="ua", discogs_token=None),
     )
-    cfg = cli.load_config(repo_root)
+    cfg = cli.load_config(Path(__file__).resolve().parents[1])
     cfg.ui_build_timeout_s = 1
     monkeypatch.setattr(cli, "load_config", lambda _root: cfg)
 
-    monkeypatch.setattr(cli, "run_dry_run", lambda *args, **kwargs: _fake_dry_run_result())
+    monkeypatch.setattr(cli, "run_dry_run", lambda *args, **kwargs: fake_dry_run_result())
 
     monkeypatch.setattr(cli, "validate_today_constraints", lambda *args, **kwargs: [])
     monkeypatch.setattr(cli, "musicbrainz_get_release_group_details", lambda *args, **kwargs: None)
     monkeypatch.setattr(cli, "_wikipedia_overview_from_url", lambda *args, **kwargs: None)
 
-    def fake_run(*args, **kwargs):
-        raise subprocess.TimeoutExpired(cmd=kwargs.get("args", args[0]), timeout=1)
+    killed = []
+
+    class FakePopen:
+        def __init__(self, args, **kwargs):
+            self.args = args
+            self.returncode = None
 
-    monkeypatch.setattr(cli.subprocess, "run", fake_run)
+        def wait(self, timeout=None):
+            if timeout is not None and self.returncode is None:
+                raise subprocess.TimeoutExpired(cmd=self.args, timeout=timeout)
+            return self.returncode
+
+        def poll(self):
+            return self.returncode
+
+        def kill(self):
+            killed.append(self.args)
+            self.returncode = -9
+
+    monkeypatch.setattr(cli.subprocess, "Popen", FakePopen)
 
     rc = cli.cmd_build(
         repo_root=repo_root,
@@ -95,9 +68,12 @@ def test_cmd_build_ui_timeout_returns_nonzero(monkeypatch, tmp_path: Path):
     )
 
     assert rc == 2
+    assert len(killed) == 1
 
 
-def test_cmd_build_skip_ui_build_reuses_existing_dist(monkeypatch, tmp_path: Path):
+def test_cmd_build_skip_ui_build_reuses_existing_dist(
+    monkeypatch, tmp_path: Path, fake_dry_run_result
+):
     repo_root = tmp_path
     (repo_root / "ui" / "dist").mkdir(parents=True)
     (repo_root / "ui" / "dist" / "index.html").write_text("<div>built</div>", encoding="utf-8")
@@ -121,7 +97,7 @@ def test_cmd_build_skip_ui_build_reuses_existing_dist(monkeypatch, tmp_path: Pat
 
     def fake_run_dry_run(*args, **kwargs):
         calls["count"] += 1
-        return _fake_dry_run_result(calls["count"] * 10)
+        return fake_dry_run_result(calls["count"] * 10)
 
     monkeypatch.setattr(cli, "run_dry_run", fake_run_dry_run)
     monkeypatch.setattr(cli, "validate_today_constraints", lambda *args, **kwargs: [])
@@ -132,6 +108,7 @@ def test_cmd_build_skip_ui_build_reuses_existing_dist(monkeypatch, tmp_path: Pat
         raise AssertionError("npm should not run when --skip-ui-build is set")
 
     monkeypatch.setattr(cli.subprocess, "run", fail_if_npm_runs)
+    monkeypatch.setattr(cli.subprocess, "Popen", fail_if_npm_runs)
 
     rc = cli.cmd_build(
         repo_root=repo_root,
@@ -178,3 +155,48 @@ def test_cmd_build_skip_ui_build_reuses_existing_dist(monkeypatch, tmp_path: Pat
     assert "lastfm-secret-value" not in observability_text
     assert "mb-secret-user-agent" not in observability_text
     assert "discogs-secret-token" not in observability_text
+
+
+def test_cmd_build_stops_ui_build_even_if_broker_close_fails(monkeypatch, tmp_path: Path):
+    (tmp_path / "ui").mkdir()
+    monkeypatch.setattr(
+        cli,
+        "load_env",
+        lambda _root: SimpleNamespace(lastfm_api_key="k", mb_user_agent="ua", discogs_token=None),
+    )
+    cfg = cli.load_config(Path(__file__).resolve().parents[1])
+    monkeypatch.setattr(cli, "load_config", lambda _root: cfg)
+
+    class FailingCloseBroker:
+        def __init__(self, **kwargs):
+            pass
+
+        def close(self):
+            raise RuntimeError("close failed")
+
+    stopped = []
+    monkeypatch.setattr(cli, "RequestBroker", FailingCloseBroker)
+    monkeypatch.setattr(cli, "_start_ui_build", lambda *_args: ("proc", "output"))
+    monkeypatch.setattr(cli, "_stop_ui_build", lambda *build: stopped.append(build))
+
+    with pytest.raises(RuntimeError, match="close failed"):
+        cli.cmd_build(
+            repo_root=tmp_path,
+            tag="auto",
+            n=30,
+            topk=10,
+            verbose=False,
+            split_slots=True,
+            mb_search_limit=10,
+            min_confidence=0.8,
+            ambiguity_gap=0.06,
+            mb_debug=False,
+            quarantine_out="",
+            out_dir="_build/public",
+            date_override="1999-01-01",
+            theme="",
+            diagnostics=False,
+            skip_ui_build=False,
+        )
+
+    assert stopped == [("proc", "output")]
@@ -55,3 +55,22 @@ def test_validator_catches_duplication_and_cooldown_rules():
     assert "duplicate artist" in errors
     assert "artist cooldown violation" in errors
     assert "theme cooldown violation" in errors
+
+
+def test_history_index_precomputes_last_seen_ordinals():
+    from datetime import date
+
+    history = HistoryIndex(
+        album_keys=set(),
+        artist_last_seen={
+            "artist-1": "2026-01-14",
+            "artist-2": "2026-01-14",
+            "broken": "not-a-date",
+        },
+        style_last_seen={"techno": "2026-01-18", "empty": ""},
+    )
+    assert history.artist_last_seen_ord == {
+        "artist-1": date(2026, 1, 14).toordinal(),
+        "artist-2": date(2026, 1, 14).toordinal(),
+    }
+    assert date(2026, 1, 20).toordinal() - history.style_last_seen_ord["techno"] == 2
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+import pytest
+
 from daily3albums.adapters import LastFmTopAlbum
 from daily3albums import dry_run as dr
 
@@ -162,3 +164,30 @@ def test_run_dry_run_mb_time_budget(monkeypatch):
     assert out["mb_budget_exceeded"] is True
     assert out["mb_cap_hit"] is True
     assert out["mb_candidates_normalized"] == 2
+
+
+def test_fetch_lastfm_pages_keeps_page_order(monkeypatch):
+    def fake_top(_broker, _key, tag, limit, page):
+        return [page]
+
+    monkeypatch.setattr(dr, "lastfm_tag_top_albums", fake_top)
+
+    out = dr._fetch_lastfm_pages(_Broker(), "k", "ambient", [3, 4, 5, 6, 7])
+    assert out == [[3], [4], [5], [6], [7]]
+    assert dr._fetch_lastfm_pages(_Broker(), "k", "ambient", []) == []
+
+
+def test_fetch_lastfm_pages_stops_when_first_page_fails(monkeypatch):
+    requested: list[int] = []
+
+    def fake_top(_broker, _key, tag, limit, page):
+        requested.append(page)
+        if page == 1:
+            raise RuntimeError("lastfm down")
+        return []
+
+    monkeypatch.setattr(dr, "lastfm_tag_top_albums", fake_top)
+
+    with pytest.raises(RuntimeError):
+        dr._fetch_lastfm_pages(_Broker(), "k", "ambient", [1, 2, 3, 4])
+    assert requested == [1]
@@ -1,6 +1,8 @@
 from pathlib import Path
+from types import SimpleNamespace
 
 import httpx
+import pytest
 
 from daily3albums import cli
 from daily3albums.adapters import ProviderApiError, lastfm_tag_top_albums
@@ -25,6 +27,48 @@ def test_doctor_output_is_explicitly_basic_not_e2e(capsys):
     assert "not a full end-to-end health signal" in out
 
 
+def test_doctor_quick_skips_config(capsys, monkeypatch):
+    repo_root = Path(__file__).resolve().parents[1]
+
+    def _fail(_root):
+        raise AssertionError("quick doctor must not load config")
+
+    monkeypatch.setattr(cli, "load_config", _fail)
+    rc = cli.cmd_doctor(repo_root, quick=True)
+
+    assert rc == 0
+    out = capsys.readouterr().out
+    assert "doctor_scope=quick" in out
+    assert "env_load=OK" in out
+
+
+def test_dry_run_fails_fast_on_missing_env(capsys, monkeypatch):
+    def _fail(_root):
+        raise AssertionError("dry-run must not load config when env is incomplete")
+
+    env = SimpleNamespace(lastfm_api_key="k", mb_user_agent="")
+    monkeypatch.setattr(cli, "load_env", lambda _root: env)
+    monkeypatch.setattr(cli, "load_config", _fail)
+
+    with pytest.raises(SystemExit) as exc:
+        cli.cmd_dry_run(
+            Path("."),
+            tag="x",
+            n=1,
+            topk=1,
+            verbose=False,
+            split_slots=False,
+            mb_search_limit=1,
+            min_confidence=0.8,
+            ambiguity_gap=0.06,
+            mb_debug=False,
+            quarantine_out="",
+            diagnostics=False,
+        )
+    assert exc.value.code == 2
+    assert "Missing env MB_USER_AGENT" in capsys.readouterr().err
+
+
 def test_lastfm_application_error_has_provider_stage_and_advice():
     try:
         lastfm_tag_top_albums(
@@ -1,3 +1,5 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import httpx
@@ -68,3 +70,54 @@ def test_broker_timeout_retries(monkeypatch, tmp_path: Path):
 
     assert calls["n"] == 2
     broker.close()
+
+
+def test_broker_rate_limit_serializes_concurrent_callers(monkeypatch, tmp_path: Path):
+    host_policy = {"rate_limit_rps": 10, "ttl_default": "1h", "negative_cache_ttl": "1h"}
+    policies = {"hosts": {"example.com": host_policy}}
+    broker = RequestBroker(repo_root=tmp_path, endpoint_policies=policies)
+    sleeps: list[float] = []
+    sleeps_lock = threading.Lock()
+
+    def fake_sleep(seconds: float) -> None:
+        with sleeps_lock:
+            sleeps.append(seconds)
+
+    # 冻结时钟：所有调用都在同一时刻到达，预约时刻只取决于限速间隔
+    monkeypatch.setattr("daily3albums.request_broker.time.monotonic", lambda: 100.0)
+    monkeypatch.setattr("daily3albums.request_broker.time.sleep", fake_sleep)
+    monkeypatch.setattr(broker.client, "get", lambda *args, **kwargs: _Resp(200, b"{}"))
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        list(ex.map(lambda i: broker.get(f"https://example.com/p{i}", adapter_name="A"), range(4)))
+
+    assert sorted(sleeps) == pytest.approx([0.1, 0.2, 0.3])
+    assert broker._host_last_ts["example.com"] == pytest.approx(100.3)
+    assert broker.get_stats_snapshot()["A"]["requests"] == 4
+    broker.close()
+
+
+def test_broker_context_manager_closes_client_and_cache(tmp_path: Path):
+    with RequestBroker(repo_root=tmp_path, endpoint_policies={}) as broker:
+        assert not broker.client.is_closed
+
+    assert broker.client.is_closed
+
+
+def test_broker_records_failures_consistently_across_threads(tmp_path: Path):
+    broker = RequestBroker(repo_root=tmp_path, endpoint_policies={})
+
+    def fail(i: int) -> None:
+        broker._record_failure("DiscogsAdapter", 500 + i % 4, cached=False, non_fatal=True)
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        list(ex.map(fail, range(200)))
+
+    stats = broker.get_stats_snapshot()["DiscogsAdapter"]
+    assert stats["failures"] == 200
+    assert sum(stats[f"status_{s}"] for s in (500, 501, 502, 503)) == 200
+    last = broker.get_last_failure("DiscogsAdapter")
+    assert last is not None and last["status"] in {500, 501, 502, 503}
+    last["status"] = 0
+    assert broker.get_last_failure("DiscogsAdapter")["status"] != 0
+    broker.close()